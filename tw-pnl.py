@@ -19,18 +19,33 @@
 #
 # sudo apt-get install python3-pandas
 #
+# Optionally install pyarrow for faster reading of large csv files:
+#
+# sudo apt-get install python3-pyarrow
+#
 #
 # pylint: disable=C0103,C0114,C0116
 #
 
 import sys
 import os
+import io
 import getopt
-from collections import deque
+import contextlib
+import importlib.util
 import math
+from array import array
 import datetime as pydatetime
+import numpy
 import pandas
 
+# Use the multi-threaded csv parser from pyarrow if it is installed
+# and pandas is new enough (1.4 or later) to support it:
+have_pyarrow = importlib.util.find_spec('pyarrow') is not None
+csv_engine = 'c'
+if have_pyarrow and tuple(map(int, pandas.__version__.split('.')[:2])) >= (1, 4):
+    csv_engine = 'pyarrow'
+
 convert_currency = True
 
 # For an unknown symbol (underlying), assume it is a individual/normal stock.
@@ -55,7 +70,7 @@ def read_eurusd():
 def get_eurusd(date, debug=False):
     while True:
         x = eurusd[date]
-        if str(x) != 'nan':
+        if not math.isnan(x):
             return x
         if debug:
             print('EURUSD conversion not found for', date)
@@ -71,57 +86,74 @@ def usd2eur(x, date):
         return x / get_eurusd(date)
     return x
 
-def check_tcode(tcode, tsubcode, description):
-    if tcode not in ['Money Movement', 'Trade', 'Receive Deliver']:
+# The following checks run once over the complete csv data
+# instead of being called for each transaction.
+def check_tcode(wk):
+    tcode = wk['Transaction Code']
+    tsubcode = wk['Transaction Subcode']
+    description = wk['Description']
+    if not tcode.isin(['Money Movement', 'Trade', 'Receive Deliver']).all():
+        raise
+    mask = tcode == 'Money Movement'
+    if not tsubcode[mask].isin(['Transfer', 'Deposit', 'Credit Interest', 'Balance Adjustment',
+        'Fee', 'Withdrawal', 'Dividend']).all():
+        raise
+    mask &= tsubcode == 'Balance Adjustment'
+    if not (description[mask] == 'Regulatory fee adjustment').all():
+        raise
+    mask = tcode == 'Trade'
+    if not tsubcode[mask].isin(['Sell to Open', 'Buy to Close', 'Buy to Open', 'Sell to Close']).all():
+        raise
+    mask = tcode == 'Receive Deliver'
+    if not tsubcode[mask].isin(['Sell to Open', 'Buy to Close', 'Buy to Open', 'Sell to Close',
+        'Expiration', 'Assignment', 'Exercise']).all():
+        raise
+    if not (description[mask & (tsubcode == 'Assignment')] == 'Removal of option due to assignment').all():
+        raise
+    if not (description[mask & (tsubcode == 'Exercise')] == 'Removal of option due to exercise').all():
         raise
-    if tcode == 'Money Movement':
-        if tsubcode not in ['Transfer', 'Deposit', 'Credit Interest', 'Balance Adjustment',
-            'Fee', 'Withdrawal', 'Dividend']:
-            raise
-        if tsubcode == 'Balance Adjustment' and description != 'Regulatory fee adjustment':
-            raise
-    elif tcode == 'Trade':
-        if tsubcode not in ['Sell to Open', 'Buy to Close', 'Buy to Open', 'Sell to Close']:
-            raise
-    elif tcode == 'Receive Deliver':
-        if tsubcode not in ['Sell to Open', 'Buy to Close', 'Buy to Open', 'Sell to Close',
-            'Expiration', 'Assignment', 'Exercise']:
-            raise
-        if tsubcode == 'Assignment' and description != 'Removal of option due to assignment':
-            raise
-        if tsubcode == 'Exercise' and description != 'Removal of option due to exercise':
-            raise
 
-def check_param(buysell, openclose, callput):
-    if str(buysell) not in ['nan', 'Buy', 'Sell']:
+def check_param(wk):
+    if not (wk['Buy/Sell'].isna() | wk['Buy/Sell'].isin(['Buy', 'Sell'])).all():
         raise
-    if str(openclose) not in ['nan', 'Open', 'Close']:
+    if not (wk['Open/Close'].isna() | wk['Open/Close'].isin(['Open', 'Close'])).all():
         raise
-    if str(callput) not in ['nan', 'C', 'P']:
+    if not (wk['Call/Put'].isna() | wk['Call/Put'].isin(['C', 'P'])).all():
         raise
 
-def check_trade(tsubcode, check_amount, amount):
+def check_trade(wk):
+    trade = wk['Transaction Code'] != 'Money Movement'
+    # Options are quoted per share, one contract is for 100 shares:
+    price = wk['Price'].fillna(.0)
+    price = price.where(wk['Expiration Date'].isna(), price * 100.0)
+    quantity = wk['Quantity'].fillna(1)
+    quantity = quantity.where(wk['Buy/Sell'] != 'Sell', - quantity)
+    check_amount = - (quantity * price)
+    amount = wk['Amount']
     #print('FEHLER:', check_amount, amount)
-    if tsubcode not in ['Expiration', 'Assignment', 'Exercise']:
-        if not math.isclose(check_amount, amount, abs_tol=0.00001):
-            raise
-    else:
-        if str(amount) != 'nan' and amount != .0:
-            raise
-        if str(check_amount) != 'nan' and check_amount != .0:
-            raise
+    mask = wk['Transaction Subcode'].isin(['Expiration', 'Assignment', 'Exercise'])
+    if not numpy.isclose(check_amount, amount, rtol=1e-9, atol=0.00001)[(trade & ~mask).to_numpy()].all():
+        raise
+    if not (amount.isna() | (amount == .0))[trade & mask].all():
+        raise
+    if not (check_amount.isna() | (check_amount == .0))[trade & mask].all():
+        raise
+
+# Well known ETFs:
+known_etfs = frozenset(['DXJ','EEM','EFA','EWZ','FEZ','FXB','FXE','FXI',
+    'GDX','GDXJ','GLD','HYG','IEF','IWM','IYR','KRE','OIH','QQQ',
+    'RSX','SLV','SMH','SPY','TLT','UNG','USO','VXX','XBI','XHB','XLB',
+    'XLE','XLF','XLI','XLK','XLP','XLU','XLV','XME','XOP','XRT'])
+
+# Well known stock names:
+known_stocks = frozenset(['M','AAPL','TSLA'])
 
 # Is the symbol a individual stock or anything else
 # like an ETF or fond?
 def is_stock(symbol):
-    # Well known ETFs:
-    if symbol in ['DXJ','EEM','EFA','EFA','EWZ','FEZ','FXB','FXE','FXI',
-        'GDX','GDXJ','GLD','HYG','IEF','IWM','IYR','KRE','OIH','QQQ',
-        'RSX','SLV','SMH','SPY','TLT','UNG','USO','VXX','XBI','XHB','XLB',
-        'XLE','XLF','XLI','XLK','XLP','XLU','XLV','XME','XOP','XRT']:
+    if symbol in known_etfs:
         return False
-    # Well known stock names:
-    if symbol in ['M','AAPL','TSLA']:
+    if symbol in known_stocks:
         return True
     # The conservative way is to through an exception if we are not sure.
     if not assume_stock:
@@ -130,15 +162,24 @@ def is_stock(symbol):
         raise
     return True # Just assume this is a normal stock if not in the above list
 
-def sign(x):
-    if x >= 0:
-        return 1
-    return -1
+# 'fifos' is a dictionary with 'asset' names. For each asset it contains
+# a FIFO stored as two parallel arrays with the 'price' (as float) and
+# the 'quantity' (as integer) of the asset, 'head' is the index of the
+# oldest entry still in the FIFO.
+# https://docs.python.org/3/library/array.html
+def fifo_new():
+    return {'price': array('d'), 'quantity': array('q'), 'head': 0}
+
+# Move the start of the FIFO to 'head'. Entries before 'head' are
+# only removed once they make up more than half of the arrays, so
+# that we do not need to move all entries on each removal.
+def fifo_set_head(fifo, head):
+    if head > len(fifo['quantity']) // 2:
+        del fifo['price'][:head]
+        del fifo['quantity'][:head]
+        head = 0
+    fifo['head'] = head
 
-# 'fifos' is a dictionary with 'asset' names. It contains a FIFO
-# 'deque()' with a list of 'price' (as float) and 'quantity' (as integer)
-# of the asset.
-# https://docs.python.org/3/library/collections.html?#collections.deque
 def fifo_add(fifos, quantity, price, asset, debug=False):
     if debug:
         print_fifos(fifos)
@@ -149,41 +190,54 @@ def fifo_add(fifos, quantity, price, asset, debug=False):
     is_option = (len(asset) > 10)
     pnl = .0
     # Find the right FIFO queue for our asset:
-    if fifos.get(asset) is None:
-        fifos[asset] = deque()
-    fifo = fifos[asset]
-    # If the queue is empty, just add it to the queue:
-    while len(fifo) > 0:
-        # If we add assets into the same trading direction,
-        # just add the asset into the queue. (Buy more if we are
-        # already long, or sell more if we are already short.)
-        if sign(fifo[0][1]) == sign(quantity):
-            break
+    fifo = fifos.get(asset)
+    if fifo is None:
+        fifo = fifos[asset] = fifo_new()
+    prices = fifo['price']
+    quantities = fifo['quantity']
+    head = fifo['head']
+    # If we add assets into the same trading direction,
+    # just add the asset into the queue. (Buy more if we are
+    # already long, or sell more if we are already short.)
+    # If the queue is empty, just add it to the queue.
+    # (A quantity of zero counts as positive here.)
+    if head < len(quantities) and (quantities[head] >= 0) != (quantity >= 0):
         # Here we start removing entries from the FIFO.
+        # If the oldest entry is not enough to finish, find all FIFO
+        # entries which are completely used up by this trade at once
+        # and remove them together:
+        if abs(quantities[head]) < abs(quantity):
+            q = numpy.frombuffer(quantities[head:], dtype=numpy.int64)
+            p = numpy.frombuffer(prices[head:], dtype=numpy.float64)
+            n = int(numpy.searchsorted(numpy.cumsum(numpy.abs(q)), abs(quantity)))
+            q_sum = int(q[:n].sum())
+            if is_option and quantity > 0:
+                pnl += q_sum * price
+            else:
+                pnl += float(numpy.dot(q[:n], price - p[:n]))
+            quantity += q_sum
+            head += n
         # Check if the FIFO queue has enough entries for
         # us to finish:
-        if abs(fifo[0][1]) >= abs(quantity):
+        if head < len(quantities):
             if is_option and quantity > 0:
                 pnl -= quantity * price
             else:
-                pnl += quantity * (fifo[0][0] - price)
-            fifo[0][1] += quantity
-            if fifo[0][1] == 0:
-                fifo.popleft()
-                if len(fifo) == 0:
+                pnl += quantity * (prices[head] - price)
+            quantities[head] += quantity
+            if quantities[head] == 0:
+                head += 1
+                if head == len(quantities):
                     del fifos[asset]
+                    return pnl
+            # Most trades only change the oldest entry:
+            if head != fifo['head']:
+                fifo_set_head(fifo, head)
             return pnl
-        # Remove the oldest FIFO entry and continue
-        # the loop for further entries (or add the
-        # remaining entries into the FIFO).
-        if is_option and quantity > 0:
-            pnl += fifo[0][1] * price
-        else:
-            pnl += fifo[0][1] * (price - fifo[0][0])
-        quantity += fifo[0][1]
-        fifo.popleft()
     # Just add this to the FIFO queue:
-    fifo.append([price, quantity])
+    prices.append(price)
+    quantities.append(quantity)
+    fifo_set_head(fifo, head)
     # selling an option is taxed directly as income
     if is_option and quantity < 0:
         pnl -= quantity * price
@@ -192,16 +246,41 @@ def fifo_add(fifos, quantity, price, asset, debug=False):
 # Check if the first entry in the FIFO
 # is 'long' the underlying or 'short'.
 def fifos_islong(fifos, asset):
-    return fifos[asset][0][1] > 0
+    fifo = fifos[asset]
+    return fifo['quantity'][fifo['head']] > 0
 
 def print_fifos(fifos):
     print('open positions:')
-    for fifo in fifos:
-        print(fifo, fifos[fifo])
+    for asset, fifo in fifos.items():
+        head = fifo['head']
+        print(asset, [[p, q] for p, q in zip(fifo['price'][head:], fifo['quantity'][head:])])
+
+# Sums which are reset at the start of each year:
+def new_yearly_sums():
+    return {
+        'dividends': .0,
+        'withholding_tax': .0,      # withholding tax = German 'Quellensteuer'
+        'withdrawal': .0,
+        'interest_recv': .0,
+        'interest_paid': .0,
+        'fee_adjustments': .0,
+        'pnl_stocks': .0,
+        'pnl': .0,
+        'usd': .0,
+        'total_fees': .0,           # sum of all fees paid
+    }
 
-def print_yearly_summary(cur_year, curr_sym, dividends, withholding_tax,
-        withdrawal, interest_recv, interest_paid, fee_adjustments, pnl_stocks,
-        pnl, usd, total_fees, total, fifos, verbose):
+def print_yearly_summary(cur_year, curr_sym, sums, total, fifos, verbose):
+    dividends = sums['dividends']
+    withholding_tax = sums['withholding_tax']
+    withdrawal = sums['withdrawal']
+    interest_recv = sums['interest_recv']
+    interest_paid = sums['interest_paid']
+    fee_adjustments = sums['fee_adjustments']
+    pnl_stocks = sums['pnl_stocks']
+    pnl = sums['pnl']
+    usd = sums['usd']
+    total_fees = sums['total_fees']
     print()
     print('Total sums paid and received in the year %s:' % cur_year)
     if dividends != .0 or withholding_tax != .0 or verbose:
@@ -224,78 +303,151 @@ def print_yearly_summary(cur_year, curr_sym, dividends, withholding_tax,
     print_fifos(fifos)
     print()
 
+# Handlers for the 'Money Movement' transactions, looked up by
+# the 'Transaction Subcode' in 'money_movements' below.
+# All handlers take the same arguments, not all of them use each one:
+# pylint: disable=W0613
+def mm_transfer(sums, header, amount, eur_amount, fees, symbol, description, long):
+    print(header, 'transferred:', description)
+
+def mm_deposit(sums, header, amount, eur_amount, fees, symbol, description, long):
+    if description != 'INTEREST ON CREDIT BALANCE':
+        mm_dividend(sums, header, amount, eur_amount, fees, symbol, description, long)
+        return
+    print(header, 'interest')
+    if amount > .0:
+        sums['interest_recv'] += eur_amount
+    else:
+        sums['interest_paid'] += eur_amount
+    if fees != .0:
+        raise
+
+def mm_balance_adjustment(sums, header, amount, eur_amount, fees, symbol, description, long):
+    if long:
+        print(header, 'balance adjustment')
+    sums['fee_adjustments'] += eur_amount
+    sums['total_fees'] += eur_amount
+    if fees != .0:
+        raise
+
+def mm_fee(sums, header, amount, eur_amount, fees, symbol, description, long):
+    # XXX Additional fees for dividends paid in short stock? Interest fees?
+    print(header, 'fees: %s,' % symbol, description)
+    sums['fee_adjustments'] += eur_amount
+    sums['total_fees'] += eur_amount
+    if amount >= .0:
+        raise
+    if fees != .0:
+        raise
+
+def mm_withdrawal(sums, header, amount, eur_amount, fees, symbol, description, long):
+    # XXX In my case dividends paid for short stock:
+    print(header, 'dividends paid: %s,' % symbol, description)
+    sums['withdrawal'] += eur_amount
+    if amount >= .0:
+        raise
+    if fees != .0:
+        raise
+
+def mm_dividend(sums, header, amount, eur_amount, fees, symbol, description, long):
+    if amount > .0:
+        sums['dividends'] += eur_amount
+        print(header, 'dividends: %s,' % symbol, description)
+    else:
+        sums['withholding_tax'] += eur_amount
+        print(header, 'withholding tax: %s,' % symbol, description)
+    if fees != .0:
+        raise
+
+money_movements = {
+    'Transfer': mm_transfer,
+    'Deposit': mm_deposit,
+    'Credit Interest': mm_deposit,
+    'Balance Adjustment': mm_balance_adjustment,
+    'Fee': mm_fee,
+    'Withdrawal': mm_withdrawal,
+    'Dividend': mm_dividend,
+}
+# pylint: enable=W0613
+
 def check(wk, long, verbose):
     #print(wk)
     curr_sym = '€'
     if not convert_currency:
         curr_sym = '$'
     fifos = {}
-    total_fees = .0           # sum of all fees paid
     total = .0                # account total
-    dividends = .0
-    withholding_tax = .0      # withholding tax = German 'Quellensteuer'
-    withdrawal = .0
-    interest_recv = .0
-    interest_paid = .0
-    fee_adjustments = .0
-    pnl_stocks = .0
-    pnl = .0
-    usd = .0
+    sums = new_yearly_sums()
     cur_year = None
-    check_account_ref = None
-    for i in range(len(wk) - 1, -1, -1):
-        datetime = str(wk['Date/Time'][i])
+    # The newest entries are on top of the csv file, reverse the
+    # data once so that we can go through it in forward order:
+    wk = wk.iloc[::-1].reset_index(drop=True)
+    check_tcode(wk)
+    check_param(wk)
+    check_trade(wk)
+    # check if the account reference does not change over time:
+    if wk['Account Reference'].nunique(dropna=False) > 1:
+        raise
+    # Extract all columns once as numpy arrays, indexing into them
+    # within the loop is much faster than going through pandas:
+    datetimes = wk['Date/Time'].dt.strftime('%Y-%m-%d %H:%M:%S').to_numpy()
+    years = wk['Date/Time'].dt.year.to_numpy()
+    tsubcodes = wk['Transaction Subcode'].to_numpy()
+    # Compare the transaction (sub)codes for all rows at once:
+    is_money_movement = (wk['Transaction Code'] == 'Money Movement').to_numpy()
+    is_removal = wk['Transaction Subcode'].isin(['Expiration', 'Exercise', 'Assignment']).to_numpy()
+    is_exercise = wk['Transaction Subcode'].isin(['Exercise', 'Assignment']).to_numpy()
+    descriptions = wk['Description'].to_numpy()
+    buysells = wk['Buy/Sell'].to_numpy()
+    fees_col = wk['Fees'].astype('float64').to_numpy()
+    amounts = wk['Amount'].astype('float64').to_numpy()
+    # Money movements do not have a quantity, just use 1 for them:
+    quantities = wk['Quantity'].fillna(1)
+    if not (quantities == quantities.round()).all():
+        raise
+    quantities = quantities.astype('int64').to_numpy()
+    symbols = wk['Symbol'].to_numpy()
+    expires = wk['Expiration Date'].to_numpy()
+    prices = wk['Price'].to_numpy()
+    # Build the asset names for all transactions at once. Options are named
+    # like 'SPY P300 20-02-21' or 'AAPL C320.5 20-01-31', all others just
+    # use the symbol name:
+    options = wk[wk['Expiration Date'].notna()]
+    expire = pandas.to_datetime(options['Expiration Date'].astype(str),
+        format='%m/%d/%Y').dt.strftime('%y-%m-%d')
+    strike = options['Strike']
+    strike = strike.astype(str).where(strike != strike.round(), strike.astype('int64').astype(str))
+    assets = wk['Symbol'].astype(object)
+    assets[options.index] = options['Symbol'] + ' ' + options['Call/Put'].astype(str) + \
+        strike + ' ' + expire
+    assets = assets.to_numpy()
+    for i in range(len(wk)):
+        datetime = datetimes[i]
         # datetime does not have any seconds, minimum output is minutes:
         if datetime[16:] != ':00':
             raise
         datetime = datetime[:16]
         date = datetime[:10] # year-month-day but no time
-        if cur_year != datetime[:4]:
+        if cur_year != years[i]:
             if cur_year is not None:
-                print_yearly_summary(cur_year, curr_sym, dividends, withholding_tax,
-                    withdrawal, interest_recv, interest_paid, fee_adjustments, pnl_stocks,
-                    pnl, usd, total_fees, total, fifos, verbose)
-                dividends = .0
-                withholding_tax = .0
-                withdrawal = .0
-                interest_recv = .0
-                interest_paid = .0
-                fee_adjustments = .0
-                pnl_stocks = .0
-                pnl = .0
-                usd = .0
-                total_fees = .0
-            cur_year = datetime[:4]
-        tcode = wk['Transaction Code'][i]
-        tsubcode = wk['Transaction Subcode'][i]
-        description = wk['Description'][i]
-        check_tcode(tcode, tsubcode, description)
-        buysell = wk['Buy/Sell'][i]
-        openclose = wk['Open/Close'][i]
-        callput = wk['Call/Put'][i]
-        check_param(buysell, openclose, callput)
-        account_ref = wk['Account Reference'][i]
-        if check_account_ref is None:
-            check_account_ref = account_ref
-        if account_ref != check_account_ref: # check if this does not change over time
-            raise
-        fees = float(wk['Fees'][i])
-        total_fees += usd2eur(fees, date)
-        amount = float(wk['Amount'][i])
+                print_yearly_summary(cur_year, curr_sym, sums, total, fifos, verbose)
+                sums = new_yearly_sums()
+            cur_year = years[i]
+        tsubcode = tsubcodes[i]
+        description = descriptions[i]
+        buysell = buysells[i]
+        fees = fees_col[i]
+        sums['total_fees'] += usd2eur(fees, date)
+        amount = amounts[i]
         total += amount - fees
         eur_amount = usd2eur(amount, date)
-        usd += fifo_add(fifos, int((amount - fees) * 10000), 1 / get_eurusd(date), 'account-usd')
-
-        quantity = wk['Quantity'][i]
-        if str(quantity) != 'nan':
-            if int(quantity) != quantity:
-                raise
-            quantity = int(quantity)
-        symbol = wk['Symbol'][i]
-        expire = wk['Expiration Date'][i]
-        strike = wk['Strike'][i]
-        price = wk['Price'][i]
-        if str(price) == 'nan':
+        sums['usd'] += fifo_add(fifos, int((amount - fees) * 10000), 1 / get_eurusd(date), 'account-usd')
+
+        quantity = quantities[i]
+        symbol = symbols[i]
+        expire = expires[i]
+        price = prices[i]
+        if math.isnan(price):
             price = .0
         if price < .0:
             raise
@@ -303,82 +455,26 @@ def check(wk, long, verbose):
         header = '%s %s %s' % (datetime, f'{eur_amount:10.2f}' + curr_sym, f'{amount:10.2f}' + '$')
         if verbose:
             header += ' %s' % f'{get_eurusd(date):8.4f}'
-        if str(quantity) == 'nan':
-            quantity = 1
         header += ' %5d' % quantity
 
-        if tcode == 'Money Movement':
-            if tsubcode == 'Transfer':
-                print(header, 'transferred:', description)
-            elif tsubcode  in ['Deposit', 'Credit Interest']:
-                if description == 'INTEREST ON CREDIT BALANCE':
-                    print(header, 'interest')
-                    if amount > .0:
-                        interest_recv += eur_amount
-                    else:
-                        interest_paid += eur_amount
-                else:
-                    if amount > .0:
-                        dividends += eur_amount
-                        print(header, 'dividends: %s,' % symbol, description)
-                    else:
-                        withholding_tax += eur_amount
-                        print(header, 'withholding tax: %s,' % symbol, description)
-                if fees != .0:
-                    raise
-            elif tsubcode == 'Balance Adjustment':
-                if long:
-                    print(header, 'balance adjustment')
-                fee_adjustments += eur_amount
-                total_fees += eur_amount
-                if fees != .0:
-                    raise
-            elif tsubcode == 'Fee':
-                # XXX Additional fees for dividends paid in short stock? Interest fees?
-                print(header, 'fees: %s,' % symbol, description)
-                fee_adjustments += eur_amount
-                total_fees += eur_amount
-                if amount >= .0:
-                    raise
-                if fees != .0:
-                    raise
-            elif tsubcode == 'Withdrawal':
-                # XXX In my case dividends paid for short stock:
-                print(header, 'dividends paid: %s,' % symbol, description)
-                withdrawal += eur_amount
-                if amount >= .0:
-                    raise
-                if fees != .0:
-                    raise
-            elif tsubcode == 'Dividend':
-                if amount > .0:
-                    dividends += eur_amount
-                    print(header, 'dividends: %s,' % symbol, description)
-                else:
-                    withholding_tax += eur_amount
-                    print(header, 'withholding tax: %s,' % symbol, description)
-                if fees != .0:
-                    raise
+        if is_money_movement[i]:
+            money_movements[tsubcode](sums, header, amount, eur_amount, fees,
+                symbol, description, long)
         else:
-            asset = symbol
-            if str(expire) != 'nan':
-                expire = pydatetime.datetime.strptime(expire, '%m/%d/%Y').strftime('%y-%m-%d')
+            asset = assets[i]
+            if not pandas.isna(expire):
                 price *= 100.0
-                if int(strike) == strike:
-                    strike = int(strike)
-                asset = '%s %s%s %s' % (symbol, callput, strike, expire)
                 check_stock = False
             else:
                 check_stock = is_stock(symbol)
             # 'buysell' is not set correctly for 'Expiration'/'Exercise'/'Assignment' entries,
             # so we look into existing positions to check if we are long or short (we cannot
             # be both, so this test should be safe):
-            if str(buysell) == 'Sell' or \
-                (tsubcode in ['Expiration', 'Exercise', 'Assignment'] and fifos_islong(fifos, asset)):
+            if buysell == 'Sell' or \
+                (is_removal[i] and fifos_islong(fifos, asset)):
                 quantity = - quantity
-            if tsubcode in ['Exercise', 'Assignment'] and quantity < 0:
+            if is_exercise[i] and quantity < 0:
                 print('Assignment/Exercise for a long option, please move pnl on next line to stock:')
-            check_trade(tsubcode, - (quantity * price), amount)
             price = abs((amount - fees) / quantity)
             price = usd2eur(price, date)
             local_pnl = fifo_add(fifos, quantity, price, asset)
@@ -387,27 +483,40 @@ def check(wk, long, verbose):
                 header += ' %s' % f'{get_eurusd(date):8.4f}'
             print(header, '%5d' % quantity, asset)
             if check_stock:
-                pnl_stocks += local_pnl
+                sums['pnl_stocks'] += local_pnl
             else:
-                pnl += local_pnl
-
-    wk.drop('Account Reference', axis=1, inplace=True)
+                sums['pnl'] += local_pnl
 
-    print_yearly_summary(cur_year, curr_sym, dividends, withholding_tax,
-        withdrawal, interest_recv, interest_paid, fee_adjustments, pnl_stocks,
-        pnl, usd, total_fees, total, fifos, verbose)
+    print_yearly_summary(cur_year, curr_sym, sums, total, fifos, verbose)
 
     #print(wk)
 
+# Read the csv file. With 'cache' set, the data is also stored in a parquet
+# file next to the csv file and read from there on the next run, as long
+# as the csv file has not been changed in the meantime.
+def read_csv(csv_file, cache):
+    pq_file = csv_file + '.parquet'
+    if cache and os.path.exists(pq_file) and \
+        os.path.getmtime(pq_file) > os.path.getmtime(csv_file):
+        return pandas.read_parquet(pq_file)
+    wk = pandas.read_csv(csv_file, parse_dates=['Date/Time'], engine=csv_engine) # 'Expiration Date'])
+    # These columns only contain a few different values:
+    for column in ('Transaction Code', 'Transaction Subcode', 'Buy/Sell', 'Open/Close', 'Call/Put'):
+        wk[column] = wk[column].astype('category')
+    if cache:
+        wk.to_parquet(pq_file, compression='zstd')
+    return wk
+
 def usage():
-    print('tw-pnl.py [--assume-individual-stock][--long][--usd][--help][--verbose] *.csv')
+    print('tw-pnl.py [--assume-individual-stock][--cache][--long][--usd][--help][--verbose] *.csv')
 
 def main(argv):
     long = False
     verbose = False
+    cache = False
     try:
         opts, args = getopt.getopt(argv, 'hluv',
-            ['assume-individual-stock', 'help', 'long', 'usd', 'verbose'])
+            ['assume-individual-stock', 'cache', 'help', 'long', 'usd', 'verbose'])
     except getopt.GetoptError:
         usage()
         sys.exit(2)
@@ -415,6 +524,12 @@ def main(argv):
         if opt == '--assume-individual-stock':
             global assume_stock
             assume_stock = True
+        elif opt == '--cache':
+            if not have_pyarrow and importlib.util.find_spec('fastparquet') is None:
+                print('The option --cache needs pyarrow or fastparquet to be installed.')
+                usage()
+                sys.exit(2)
+            cache = True
         elif opt in ('-h', '--help'):
             usage()
             sys.exit()
@@ -431,8 +546,16 @@ def main(argv):
     read_eurusd()
     args.reverse()
     for csv_file in args:
-        wk = pandas.read_csv(csv_file, parse_dates=['Date/Time']) # 'Expiration Date'])
-        check(wk, long, verbose)
+        wk = read_csv(csv_file, cache)
+        # Collect all output in memory and write it out at once
+        # instead of writing each line separately:
+        out = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(out):
+                check(wk, long, verbose)
+        finally:
+            sys.stdout.write(out.getvalue())
+            sys.stdout.flush()
 
 if __name__ == '__main__':
     main(sys.argv[1:])